@@ -0,0 +1,110 @@
+"""
+Measure per-invocation logging overhead and bytes logged by the API Lambda.
+
+Runs lambda_handler on the successful post path with Secrets Manager and the
+Threads API mocked, and compares:
+
+- before: every record written as its own line with the Lambda runtime prefix,
+  as the root logger at INFO did before structured logging
+- after: the InvocationLogHandler summary line, at several sample rates
+
+Usage (from the repository root, requires boto3):
+
+    python benchmarks/bench_invocation_log.py [--invocations 20000]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import time
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "source", "shared"))
+sys.path.insert(0, os.path.join(ROOT, "source", "api"))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ["SECRET_NAME_PREFIX"] = "threads/tokens"
+os.environ.pop("ADMISSION_TABLE_NAME", None)
+
+import main as api_main  # noqa: E402
+
+LAMBDA_LINE_FORMAT = (
+    "[%(levelname)s]\t2026-01-01T00:00:00.000Z\t8f5e2c1a-6b1d-4e55-9d7b-3c0f1e2a4b6d\t%(message)s"
+)
+
+EVENT = {
+    "body": json.dumps({"user_id": "user_123", "post_text": "hello", "topic_tag": "bench"}),
+    "requestContext": {"requestId": "a1b2c3d4-e5f6-7890-abcd-ef0123456789"},
+}
+
+
+class FakeContext:
+    aws_request_id = "8f5e2c1a-6b1d-4e55-9d7b-3c0f1e2a4b6d"
+
+    def get_remaining_time_in_millis(self):
+        return 30000
+
+
+class FakeResponse:
+    def read(self):
+        return b'{"id": "1234567890"}'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def _run(invocations: int) -> tuple[float, float, float]:
+    sink = io.StringIO()
+    secret = {"SecretString": json.dumps({"long_lived_token": "token"})}
+
+    with mock.patch.object(api_main.secrets_manager, "get_secret_value", return_value=secret), \
+            mock.patch("urllib.request.urlopen", return_value=FakeResponse()), \
+            contextlib.redirect_stdout(sink):
+        for handler in api_main.LOGGER.handlers:
+            handler.stream = sink
+
+        started = time.perf_counter()
+        for _ in range(invocations):
+            response = api_main.lambda_handler(EVENT, FakeContext())
+        elapsed = time.perf_counter() - started
+
+    assert response["statusCode"] == 200, response
+    lines = sink.getvalue().splitlines()
+    return elapsed / invocations * 1e6, len(sink.getvalue().encode()) / invocations, len(lines) / invocations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--invocations", type=int, default=20000)
+    args = parser.parse_args()
+
+    rows = []
+
+    line_handler = logging.StreamHandler()
+    line_handler.setFormatter(logging.Formatter(LAMBDA_LINE_FORMAT))
+    api_main.LOGGER.removeHandler(api_main.INVOCATION_LOG)
+    api_main.LOGGER.addHandler(line_handler)
+    with mock.patch.object(api_main.INVOCATION_LOG, "start"), mock.patch.object(api_main.INVOCATION_LOG, "finish"):
+        rows.append(("before (line per record)",) + _run(args.invocations))
+    api_main.LOGGER.removeHandler(line_handler)
+    api_main.LOGGER.addHandler(api_main.INVOCATION_LOG)
+
+    for sample_rate in (0.0, 0.01, 1.0):
+        api_main.INVOCATION_LOG.sample_rate = sample_rate
+        rows.append((f"after (sample rate {sample_rate})",) + _run(args.invocations))
+
+    print(f"{'mode':<28} {'us/invocation':>14} {'bytes/invocation':>17} {'lines/invocation':>17}")
+    for name, micros, size, lines in rows:
+        print(f"{name:<28} {micros:>14.1f} {size:>17.0f} {lines:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+"""
+Load-shedding admission control for the Threads posting Lambda.
+
+In-flight requests are counted per user and globally in a counter store
+shared by all warm containers (DynamoDB), together with a moving average of
+Threads API latency. When the caps are reached, or the upstream is slow,
+lower-priority requests are rejected immediately instead of waiting on the
+upstream for up to the Lambda timeout.
+"""
+
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+LOGGER = logging.getLogger("threads.api.admission")
+
+PRIORITIES = ("high", "normal", "low")
+
+# Share of the global cap each priority may fill. High-priority requests can
+# use the whole cap, so the remainder is effectively reserved for them.
+PRIORITY_SHARES = {
+    "high": 1.0,
+    "normal": 0.8,
+    "low": 0.5,
+}
+
+GLOBAL_KEY = "global"
+UPSTREAM_KEY = "upstream"
+
+# Errors from the counter store: service errors and connection/read failures
+STORE_ERRORS = (ClientError, BotoCoreError)
+
+
+class OverloadedError(Exception):
+    """Custom exception for requests rejected by admission control."""
+
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class InMemoryCounterStore:
+    """
+    Process-local counter store.
+
+    Used when no shared table is configured (local runs and tests). Counts only
+    cover the current container.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._leases: Dict[str, Dict[str, float]] = {}
+        self._latency_ms = 0.0
+        self._latency_updated_at = 0.0
+
+    def try_acquire(self, key: str, lease_id: str, limit: int, expires_at: float) -> bool:
+        now = time.time()
+        with self._lock:
+            leases = self._leases.setdefault(key, {})
+            for expired_id in [i for i, expiry in leases.items() if expiry <= now]:
+                del leases[expired_id]
+
+            if len(leases) >= limit:
+                return False
+            leases[lease_id] = expires_at
+            return True
+
+    def release(self, key: str, lease_id: str) -> None:
+        with self._lock:
+            self._leases.get(key, {}).pop(lease_id, None)
+
+    def in_flight(self, key: str) -> int:
+        """Return the number of unexpired slots held for a key."""
+        now = time.time()
+        with self._lock:
+            return sum(1 for expires_at in self._leases.get(key, {}).values() if expires_at > now)
+
+    def get_upstream_latency(self) -> tuple[float, float]:
+        return self._latency_ms, self._latency_updated_at
+
+    def set_upstream_latency_ms(self, latency_ms: float) -> None:
+        self._latency_ms = latency_ms
+        self._latency_updated_at = time.time()
+
+
+class DynamoDBCounterStore:
+    """
+    Counter store backed by a DynamoDB table keyed by "pk" and "sk".
+
+    For each key, an item with sk "counter" holds the in-flight count and one
+    item per admitted request (sk "lease#<lease_id>") holds its expiry. Every
+    change to the count is made in the same transaction as the creation or
+    deletion of a lease, so the count always equals the number of leases.
+    Transactions carry a ClientRequestToken derived from the lease, so SDK
+    retries of a request that was already applied do not apply it twice.
+
+    A Lambda killed before releasing leaves its lease behind. When a key is at
+    its cap, expired leases are deleted, each in a transaction that also
+    decrements the count, so the slots of live requests are never overwritten.
+    """
+
+    REAP_INTERVAL_SECONDS = 5.0
+    CONFLICT_ATTEMPTS = 3
+
+    def __init__(self, client: Any, table_name: str) -> None:
+        self._client = client
+        self._table_name = table_name
+        self._reaped_at: Dict[str, float] = {}
+
+    def try_acquire(self, key: str, lease_id: str, limit: int, expires_at: float) -> bool:
+        if self._claim(key, lease_id, limit, expires_at, "acquire"):
+            return True
+        if self._reap_expired_leases(key):
+            return self._claim(key, lease_id, limit, expires_at, "acquire-after-reap")
+        return False
+
+    def release(self, key: str, lease_id: str) -> None:
+        reasons = self._transact(
+            f"release:{key}:{lease_id}",
+            self._delete_lease_item(key, lease_id, "attribute_exists(sk)", {}),
+            self._update_counter_item(key, -1),
+        )
+        if reasons:
+            # Already reclaimed, or still contended; an unreleased lease expires
+            LOGGER.info("Slot %s for %s not released: %s", key, lease_id, reasons)
+
+    def get_upstream_latency(self) -> tuple[float, float]:
+        response = self._client.get_item(
+            TableName=self._table_name,
+            Key={"pk": {"S": UPSTREAM_KEY}, "sk": {"S": "latency"}},
+            ProjectionExpression="latency_ms, updated_at",
+        )
+        item = response.get("Item", {})
+        return (
+            float(item.get("latency_ms", {}).get("N", "0")),
+            float(item.get("updated_at", {}).get("N", "0")),
+        )
+
+    def set_upstream_latency_ms(self, latency_ms: float) -> None:
+        self._client.update_item(
+            TableName=self._table_name,
+            Key={"pk": {"S": UPSTREAM_KEY}, "sk": {"S": "latency"}},
+            UpdateExpression="SET latency_ms = :latency, updated_at = :now",
+            ExpressionAttributeValues={
+                ":latency": {"N": str(round(latency_ms, 1))},
+                ":now": {"N": str(int(time.time()))},
+            },
+        )
+
+    def _claim(self, key: str, lease_id: str, limit: int, expires_at: float, operation: str) -> bool:
+        counter = self._update_counter_item(key, 1)
+        counter["Update"]["ConditionExpression"] = "attribute_not_exists(in_flight) OR in_flight < :limit"
+        counter["Update"]["ExpressionAttributeValues"][":limit"] = {"N": str(limit)}
+
+        reasons = self._transact(
+            f"{operation}:{key}:{lease_id}",
+            counter,
+            {
+                "Put": {
+                    "TableName": self._table_name,
+                    "Item": {
+                        "pk": {"S": key},
+                        "sk": {"S": f"lease#{lease_id}"},
+                        "expires_at": {"N": str(int(expires_at))},
+                    },
+                    "ConditionExpression": "attribute_not_exists(sk)",
+                },
+            },
+        )
+        if reasons is None:
+            return True
+
+        counter_reason, lease_reason = (reasons + ["None", "None"])[:2]
+        if lease_reason == "ConditionalCheckFailed":
+            # This request already holds the lease
+            return True
+        if counter_reason != "ConditionalCheckFailed":
+            LOGGER.info("Slot %s contended, treating as full: %s", key, reasons)
+        return False
+
+    def _reap_expired_leases(self, key: str) -> int:
+        """Delete expired leases for a key, at most once per REAP_INTERVAL_SECONDS."""
+        if time.monotonic() - self._reaped_at.get(key, float("-inf")) < self.REAP_INTERVAL_SECONDS:
+            return 0
+        self._reaped_at[key] = time.monotonic()
+
+        now = {":now": {"N": str(int(time.time()))}}
+        response = self._client.query(
+            TableName=self._table_name,
+            KeyConditionExpression="pk = :key AND begins_with(sk, :lease)",
+            FilterExpression="expires_at < :now",
+            ProjectionExpression="sk",
+            ExpressionAttributeValues={
+                ":key": {"S": key},
+                ":lease": {"S": "lease#"},
+                **now,
+            },
+        )
+
+        reaped = 0
+        for item in response.get("Items", []):
+            lease_id = item["sk"]["S"][len("lease#"):]
+            reasons = self._transact(
+                f"reap:{key}:{lease_id}",
+                self._delete_lease_item(key, lease_id, "expires_at < :now", now),
+                self._update_counter_item(key, -1),
+            )
+            if reasons is None:
+                reaped += 1
+
+        if reaped:
+            LOGGER.warning("Reclaimed %s expired in-flight slots: %s", reaped, key)
+        return reaped
+
+    def _delete_lease_item(self, key: str, lease_id: str, condition: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        delete: Dict[str, Any] = {
+            "TableName": self._table_name,
+            "Key": {"pk": {"S": key}, "sk": {"S": f"lease#{lease_id}"}},
+            "ConditionExpression": condition,
+        }
+        if values:
+            delete["ExpressionAttributeValues"] = values
+        return {"Delete": delete}
+
+    def _update_counter_item(self, key: str, delta: int) -> Dict[str, Any]:
+        return {
+            "Update": {
+                "TableName": self._table_name,
+                "Key": {"pk": {"S": key}, "sk": {"S": "counter"}},
+                "UpdateExpression": "ADD in_flight :delta",
+                "ExpressionAttributeValues": {":delta": {"N": str(delta)}},
+            },
+        }
+
+    def _transact(self, token_name: str, *items: Dict[str, Any]) -> Optional[List[str]]:
+        """
+        Run a write transaction, retrying conflicts with other transactions.
+
+        Returns:
+            None on success, otherwise the cancellation reason code per item
+        """
+        reasons: List[str] = []
+        for attempt in range(self.CONFLICT_ATTEMPTS):
+            token = uuid.uuid5(uuid.NAMESPACE_URL, f"{self._table_name}:{token_name}:{attempt}")
+            try:
+                self._client.transact_write_items(TransactItems=list(items), ClientRequestToken=str(token))
+                return None
+            except self._client.exceptions.TransactionCanceledException as e:
+                reasons = [reason.get("Code", "None") for reason in e.response.get("CancellationReasons", [])]
+                if "TransactionConflict" not in reasons:
+                    return reasons
+                time.sleep(random.uniform(0.01, 0.05))
+        return reasons
+
+
+class AdmissionController:
+    """
+    Enforce per-user and global concurrency caps with priority-based shedding.
+
+    A request is admitted when the global in-flight count is below its
+    priority's share of global_limit and the user's count is below user_limit.
+    While the upstream latency average is above slow_upstream_ms, low-priority
+    requests are rejected outright and normal-priority requests are limited to
+    the low-priority share. The average is ignored once it has not been updated
+    for latency_window_seconds, so shedding stops when no request refreshes it.
+    Errors from the counter store fail open so that an outage of the store does
+    not block posting. After an error, the store is not used to admit requests
+    or track latency for store_retry_seconds, so that requests in the same
+    container do not each wait on its timeouts. Slots already held are still
+    released.
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        global_limit: int,
+        user_limit: int,
+        slow_upstream_ms: float,
+        lease_seconds: float,
+        latency_window_seconds: float = 60.0,
+        latency_cache_seconds: float = 5.0,
+        latency_smoothing: float = 0.2,
+        store_retry_seconds: float = 30.0,
+    ) -> None:
+        self.store = store
+        self.global_limit = global_limit
+        self.user_limit = user_limit
+        self.slow_upstream_ms = slow_upstream_ms
+        self.lease_seconds = lease_seconds
+        self.latency_window_seconds = latency_window_seconds
+        self.latency_cache_seconds = latency_cache_seconds
+        self.latency_smoothing = latency_smoothing
+        self.store_retry_seconds = store_retry_seconds
+        self._store_unavailable_until = float("-inf")
+        self._latency_ms = 0.0
+        self._latency_updated_at = 0.0
+        self._latency_read_at = float("-inf")
+
+    def upstream_latency_ms(self) -> float:
+        """Return the shared upstream latency average, or 0 once it is stale."""
+        if (
+            time.monotonic() - self._latency_read_at >= self.latency_cache_seconds
+            and self.store_available()
+        ):
+            try:
+                self._latency_ms, self._latency_updated_at = self.store.get_upstream_latency()
+            except STORE_ERRORS as e:
+                self._store_failed("Failed to read upstream latency", e)
+            self._latency_read_at = time.monotonic()
+
+        if time.time() - self._latency_updated_at > self.latency_window_seconds:
+            return 0.0
+        return self._latency_ms
+
+    def record_upstream_latency(self, latency_ms: float) -> None:
+        """Fold one upstream call duration into the shared moving average."""
+        current = self.upstream_latency_ms()
+        if current:
+            latency_ms = current + self.latency_smoothing * (latency_ms - current)
+        self._latency_ms = latency_ms
+        self._latency_updated_at = time.time()
+
+        if not self.store_available():
+            return
+        try:
+            self.store.set_upstream_latency_ms(latency_ms)
+        except STORE_ERRORS as e:
+            self._store_failed("Failed to record upstream latency", e)
+
+    def global_limit_for(self, priority: str) -> int:
+        """Return the global in-flight cap applied to a priority."""
+        if priority != "high" and self.upstream_latency_ms() > self.slow_upstream_ms:
+            if priority == "low":
+                return 0
+            priority = "low"
+        return max(math.floor(self.global_limit * PRIORITY_SHARES[priority]), 1)
+
+    def store_available(self) -> bool:
+        """Return False while the store is skipped after an error."""
+        return time.monotonic() >= self._store_unavailable_until
+
+    def retry_after(self) -> int:
+        """Return a Retry-After hint in seconds based on upstream latency."""
+        return min(max(math.ceil(self.upstream_latency_ms() / 1000), 1), 30)
+
+    @contextmanager
+    def admit(self, user_id: str, priority: str, lease_id: str) -> Iterator[None]:
+        """
+        Hold global and per-user in-flight slots for the duration of the block.
+
+        Args:
+            user_id: User identifier
+            priority: One of PRIORITIES
+            lease_id: Unique identifier of this request's slots
+
+        Raises:
+            OverloadedError: If either cap is reached for this priority
+        """
+        acquired: List[str] = []
+
+        try:
+            for key, limit in (
+                (GLOBAL_KEY, self.global_limit_for(priority)),
+                (f"user#{user_id}", self.user_limit),
+            ):
+                if limit <= 0 or not self._try_acquire(key, lease_id, limit, acquired):
+                    LOGGER.info(
+                        "Rejected %s priority request for user %s: %s limit %s reached",
+                        priority, user_id, key, limit,
+                    )
+                    raise OverloadedError(
+                        "Too many requests in flight, retry later", self.retry_after()
+                    )
+
+            yield
+        finally:
+            for key in reversed(acquired):
+                self._release(key, lease_id)
+
+    def _try_acquire(self, key: str, lease_id: str, limit: int, acquired: List[str]) -> bool:
+        if not self.store_available():
+            return True
+        try:
+            if not self.store.try_acquire(key, lease_id, limit, time.time() + self.lease_seconds):
+                return False
+        except STORE_ERRORS as e:
+            self._store_failed("Admission store unavailable, admitting request", e)
+            return True
+
+        acquired.append(key)
+        return True
+
+    def _release(self, key: str, lease_id: str) -> None:
+        try:
+            self.store.release(key, lease_id)
+        except STORE_ERRORS as e:
+            self._store_failed(f"Failed to release in-flight slot {key}", e)
+
+    def _store_failed(self, message: str, error: Exception) -> None:
+        LOGGER.warning("%s, skipping store for %ss: %s", message, self.store_retry_seconds, error)
+        self._store_unavailable_until = time.monotonic() + self.store_retry_seconds
+
+
+def create_admission_controller(
+    dynamodb_client: Optional[Any],
+    table_name: Optional[str],
+    global_limit: int,
+    user_limit: int,
+    slow_upstream_ms: float,
+    lease_seconds: float,
+) -> AdmissionController:
+    """
+    Build an AdmissionController backed by DynamoDB, or in memory without a table.
+
+    Args:
+        dynamodb_client: boto3 DynamoDB client (unused without table_name)
+        table_name: Counter table name, or None for the in-memory store
+        global_limit: Maximum in-flight requests across all containers
+        user_limit: Maximum in-flight requests per user
+        slow_upstream_ms: Upstream latency above which shedding starts
+        lease_seconds: Time after which an unreleased slot may be reclaimed;
+            must exceed the Lambda timeout
+
+    Returns:
+        Configured AdmissionController
+    """
+    if table_name:
+        store = DynamoDBCounterStore(dynamodb_client, table_name)
+    else:
+        store = InMemoryCounterStore()
+
+    return AdmissionController(store, global_limit, user_limit, slow_upstream_ms, lease_seconds)
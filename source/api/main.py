@@ -10,21 +10,49 @@ This Lambda function:
 """
 
 import json
-import logging
 import os
+import time
 import urllib.request
 import urllib.parse
+import uuid
 from typing import Any, Dict
 
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+from admission import PRIORITIES, OverloadedError, create_admission_controller
+from invocation_log import configure_logging
+
 # Configure logging
-LOGGER = logging.getLogger()
-LOGGER.setLevel(logging.INFO)
+LOGGER, INVOCATION_LOG = configure_logging(
+    "threads.api",
+    os.environ.get("LOG_LEVEL", "INFO"),
+    float(os.environ.get("LOG_SAMPLE_RATE", "0.01")),
+)
 
 # AWS clients
 secrets_manager = boto3.client("secretsmanager")
+# Short timeouts so admission control rejects quickly even when DynamoDB is slow
+dynamodb = boto3.client(
+    "dynamodb",
+    config=Config(connect_timeout=1, read_timeout=1, retries={"max_attempts": 2, "mode": "standard"}),
+)
+
+# Admission control shared across warm containers
+ADMISSION = create_admission_controller(
+    dynamodb,
+    os.environ.get("ADMISSION_TABLE_NAME"),
+    global_limit=int(os.environ.get("ADMISSION_GLOBAL_LIMIT", "50")),
+    user_limit=int(os.environ.get("ADMISSION_USER_LIMIT", "5")),
+    slow_upstream_ms=float(os.environ.get("ADMISSION_SLOW_UPSTREAM_MS", "5000")),
+    lease_seconds=float(os.environ.get("ADMISSION_LEASE_SECONDS", "60")),
+)
+
+# Threads API calls stop this long before the Lambda deadline, leaving time to
+# release admission slots and record upstream latency
+UPSTREAM_TIMEOUT_SECONDS = 30
+UPSTREAM_DEADLINE_MARGIN_MS = 3000
 
 
 class TokenNotFoundError(Exception):
@@ -42,6 +70,11 @@ class ValidationError(Exception):
     pass
 
 
+class DeadlineError(Exception):
+    """Custom exception for requests too close to the Lambda deadline."""
+    pass
+
+
 def _get_long_lived_token_from_secrets_manager(user_id: str, secret_name_prefix: str) -> str:
     """
     Retrieve user long-lived access token from AWS Secrets Manager.
@@ -65,30 +98,56 @@ def _get_long_lived_token_from_secrets_manager(user_id: str, secret_name_prefix:
 
         long_lived_token = secret_data.get("long_lived_token")
         if not long_lived_token:
-            LOGGER.error(f"Secret exists but no long_lived_token found for user {user_id}")
+            LOGGER.error("Secret exists but no long_lived_token found for user %s", user_id)
             raise TokenNotFoundError(f"Long-lived token not found for user: {user_id}")
 
         return long_lived_token
 
     except secrets_manager.exceptions.ResourceNotFoundException:
-        LOGGER.warning(f"Secret not found for user: {user_id}")
+        LOGGER.warning("Secret not found for user: %s", user_id)
         raise TokenNotFoundError(f"Token not found for user: {user_id}")
     except ClientError as e:
         error_code = e.response.get("Error", {}).get("Code", "Unknown")
-        LOGGER.error(f"Failed to retrieve secret for user {user_id}: {error_code}")
+        LOGGER.error("Failed to retrieve secret for user %s: %s", user_id, error_code)
         raise TokenNotFoundError(f"Failed to retrieve token for user: {user_id}") from e
     except json.JSONDecodeError as e:
-        LOGGER.error(f"Failed to parse secret value for user {user_id}: {e}")
+        LOGGER.error("Failed to parse secret value for user %s: %s", user_id, e)
         raise TokenNotFoundError(f"Invalid token data for user: {user_id}") from e
 
 
-def _create_threads_container(post_text: str, topic_tag: str, access_token: str) -> str:
+def _upstream_timeout(context: Any) -> float:
+    """
+    Return a Threads API timeout that ends before the Lambda deadline.
+
+    Args:
+        context: Lambda context
+
+    Returns:
+        Timeout in seconds
+
+    Raises:
+        DeadlineError: If too little time is left to call the Threads API
+    """
+    get_remaining_time = getattr(context, "get_remaining_time_in_millis", None)
+    if get_remaining_time is None:
+        return UPSTREAM_TIMEOUT_SECONDS
+
+    available_ms = get_remaining_time() - UPSTREAM_DEADLINE_MARGIN_MS
+    if available_ms < 1000:
+        LOGGER.error("Only %s ms left before the Lambda deadline", available_ms)
+        raise DeadlineError("Not enough time left to call Threads API")
+
+    return min(UPSTREAM_TIMEOUT_SECONDS, available_ms / 1000)
+
+
+def _create_threads_container(post_text: str, topic_tag: str, access_token: str, timeout: float) -> str:
     """
     Create a Threads post container.
 
     Args:
         post_text: Text content to post
         access_token: Long-lived access token
+        timeout: Request timeout in seconds
 
     Returns:
         Container creation ID
@@ -111,7 +170,7 @@ def _create_threads_container(post_text: str, topic_tag: str, access_token: str)
         LOGGER.info("Creating Threads post container")
         request = urllib.request.Request(post_url, data=data, method="POST")
 
-        with urllib.request.urlopen(request, timeout=30) as response:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
             body = response.read().decode()
             response_data = json.loads(body)
 
@@ -120,31 +179,32 @@ def _create_threads_container(post_text: str, topic_tag: str, access_token: str)
                 LOGGER.error("No container ID in response from Threads API")
                 raise APIError("Failed to create post container")
 
-            LOGGER.info(f"Created container with ID: {container_id}")
+            LOGGER.info("Created container with ID: %s", container_id)
             return container_id
 
     except urllib.error.HTTPError as e:
         error_body = e.read().decode() if e.fp else "No error body"
-        LOGGER.error(f"HTTP error creating container: {e.code} - {error_body}")
+        LOGGER.error("HTTP error creating container: %s - %s", e.code, error_body)
         raise APIError(f"Threads API returned HTTP {e.code}: {error_body}") from e
     except urllib.error.URLError as e:
-        LOGGER.error(f"URL error creating container: {e.reason}")
+        LOGGER.error("URL error creating container: %s", e.reason)
         raise APIError("Failed to reach Threads API") from e
     except json.JSONDecodeError as e:
-        LOGGER.error(f"Failed to parse container creation response: {e}")
+        LOGGER.error("Failed to parse container creation response: %s", e)
         raise APIError("Invalid JSON response from Threads API") from e
     except Exception as e:
-        LOGGER.error(f"Unexpected error creating container: {e}")
+        LOGGER.error("Unexpected error creating container: %s", e)
         raise APIError(f"Unexpected error creating container: {e}") from e
 
 
-def _publish_threads_container(container_id: str, access_token: str) -> str:
+def _publish_threads_container(container_id: str, access_token: str, timeout: float) -> str:
     """
     Publish a Threads post container.
 
     Args:
         container_id: Container creation ID
         access_token: Long-lived access token
+        timeout: Request timeout in seconds
 
     Returns:
         Published post ID
@@ -162,10 +222,10 @@ def _publish_threads_container(container_id: str, access_token: str) -> str:
     data = urllib.parse.urlencode(publish_payload).encode()
 
     try:
-        LOGGER.info(f"Publishing Threads container: {container_id}")
+        LOGGER.info("Publishing Threads container: %s", container_id)
         request = urllib.request.Request(publish_url, data=data, method="POST")
 
-        with urllib.request.urlopen(request, timeout=30) as response:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
             body = response.read().decode()
             response_data = json.loads(body)
 
@@ -174,33 +234,33 @@ def _publish_threads_container(container_id: str, access_token: str) -> str:
                 LOGGER.error("No post ID in response from Threads API")
                 raise APIError("Failed to publish post")
 
-            LOGGER.info(f"Published post with ID: {post_id}")
+            LOGGER.info("Published post with ID: %s", post_id)
             return post_id
 
     except urllib.error.HTTPError as e:
         error_body = e.read().decode() if e.fp else "No error body"
-        LOGGER.error(f"HTTP error publishing container: {e.code} - {error_body}")
+        LOGGER.error("HTTP error publishing container: %s - %s", e.code, error_body)
         raise APIError(f"Threads API returned HTTP {e.code}: {error_body}") from e
     except urllib.error.URLError as e:
-        LOGGER.error(f"URL error publishing container: {e.reason}")
+        LOGGER.error("URL error publishing container: %s", e.reason)
         raise APIError("Failed to reach Threads API") from e
     except json.JSONDecodeError as e:
-        LOGGER.error(f"Failed to parse publish response: {e}")
+        LOGGER.error("Failed to parse publish response: %s", e)
         raise APIError("Invalid JSON response from Threads API") from e
     except Exception as e:
-        LOGGER.error(f"Unexpected error publishing container: {e}")
+        LOGGER.error("Unexpected error publishing container: %s", e)
         raise APIError(f"Unexpected error publishing container: {e}") from e
 
 
-def _parse_request_body(event: Dict[str, Any]) -> tuple[str, str]:
+def _parse_request_body(event: Dict[str, Any]) -> tuple[str, str, str, str]:
     """
-    Extract user_id and post_text from request body.
+    Extract user_id, post_text, topic_tag and priority from request body.
 
     Args:
         event: Lambda event dictionary
 
     Returns:
-        Tuple of (user_id, post_text)
+        Tuple of (user_id, post_text, topic_tag, priority)
 
     Raises:
         ValidationError: If required parameters are missing
@@ -213,12 +273,13 @@ def _parse_request_body(event: Dict[str, Any]) -> tuple[str, str]:
     try:
         parsed_body = json.loads(body)
     except json.JSONDecodeError as e:
-        LOGGER.error(f"Failed to parse request body: {e}")
+        LOGGER.error("Failed to parse request body: %s", e)
         raise ValidationError("Invalid JSON in request body") from e
 
     user_id = parsed_body.get("user_id")
     post_text = parsed_body.get("post_text")
     topic_tag = parsed_body.get("topic_tag")
+    priority = parsed_body.get("priority", "normal")
 
     if not user_id:
         raise ValidationError("user_id is required")
@@ -231,16 +292,19 @@ def _parse_request_body(event: Dict[str, Any]) -> tuple[str, str]:
     if not user_id:
         raise ValidationError("user_id contains invalid characters")
 
-    return user_id, post_text, topic_tag
+    if priority not in PRIORITIES:
+        raise ValidationError(f"priority must be one of: {', '.join(PRIORITIES)}")
 
+    return user_id, post_text, topic_tag, priority
 
-def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
+
+def _handle_post_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
-    Lambda handler for Threads post creation.
+    Create and publish a Threads post, mapping errors to API Gateway responses.
 
     Args:
         event: API Gateway event
-        _context: Lambda context
+        context: Lambda context
 
     Returns:
         API Gateway response with post ID
@@ -249,22 +313,29 @@ def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
 
     try:
         # Step 1: Parse user_id and post_text from request body
-        user_id, post_text, topic_tag = _parse_request_body(event)
-        LOGGER.info(f"Creating post for user: {user_id}")
+        user_id, post_text, topic_tag, priority = _parse_request_body(event)
+        INVOCATION_LOG.bind(user_id=user_id, priority=priority)
+        LOGGER.info("Creating post for user: %s", user_id)
 
         # Step 2: Get secret name prefix from environment
         secret_name_prefix = os.environ.get("SECRET_NAME_PREFIX")
         if not secret_name_prefix:
             raise ValidationError("SECRET_NAME_PREFIX environment variable not set")
 
-        # Step 3: Load long-lived token from Secrets Manager
-        access_token = _get_long_lived_token_from_secrets_manager(user_id, secret_name_prefix)
-
-        # Step 4: Create Threads post container
-        container_id = _create_threads_container(post_text, topic_tag, access_token)
-
-        # Step 5: Publish the container
-        post_id = _publish_threads_container(container_id, access_token)
+        # Step 3: Reserve in-flight slots, shedding load when over capacity
+        lease_id = getattr(context, "aws_request_id", None) or str(uuid.uuid4())
+        with ADMISSION.admit(user_id, priority, lease_id):
+            # Step 4: Load long-lived token from Secrets Manager
+            access_token = _get_long_lived_token_from_secrets_manager(user_id, secret_name_prefix)
+
+            # Step 5: Create and publish the Threads post container
+            timeout = _upstream_timeout(context)
+            started = time.perf_counter()
+            try:
+                container_id = _create_threads_container(post_text, topic_tag, access_token, timeout)
+                post_id = _publish_threads_container(container_id, access_token, _upstream_timeout(context))
+            finally:
+                ADMISSION.record_upstream_latency((time.perf_counter() - started) * 1000)
 
         # Step 6: Return the post ID
         return {
@@ -279,7 +350,7 @@ def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
         }
 
     except ValidationError as e:
-        LOGGER.warning(f"Validation error: {e}")
+        LOGGER.warning("Validation error: %s", e)
         return {
             "statusCode": 400,
             "headers": {"Content-Type": "application/json"},
@@ -289,8 +360,34 @@ def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
             }),
         }
 
+    except OverloadedError as e:
+        return {
+            "statusCode": 429,
+            "headers": {
+                "Content-Type": "application/json",
+                "Retry-After": str(e.retry_after),
+            },
+            "body": json.dumps({
+                "error": "Too Many Requests",
+                "message": str(e)
+            }),
+        }
+
+    except DeadlineError as e:
+        return {
+            "statusCode": 503,
+            "headers": {
+                "Content-Type": "application/json",
+                "Retry-After": str(ADMISSION.retry_after()),
+            },
+            "body": json.dumps({
+                "error": "Service Unavailable",
+                "message": str(e)
+            }),
+        }
+
     except TokenNotFoundError as e:
-        LOGGER.warning(f"Token not found: {e}")
+        LOGGER.warning("Token not found: %s", e)
         return {
             "statusCode": 404,
             "headers": {"Content-Type": "application/json"},
@@ -301,7 +398,7 @@ def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
         }
 
     except APIError as e:
-        LOGGER.error(f"API error: {e}")
+        LOGGER.error("API error: %s", e)
         return {
             "statusCode": 502,
             "headers": {"Content-Type": "application/json"},
@@ -321,3 +418,23 @@ def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
                 "message": "An unexpected error occurred"
             }),
         }
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Lambda handler for Threads post creation.
+
+    Args:
+        event: API Gateway event
+        context: Lambda context
+
+    Returns:
+        API Gateway response with post ID
+    """
+    INVOCATION_LOG.start(context, event)
+    response = None
+    try:
+        response = _handle_post_request(event, context)
+        return response
+    finally:
+        INVOCATION_LOG.finish(response)
@@ -10,7 +10,6 @@ This Lambda function:
 """
 
 import json
-import logging
 import os
 from typing import Any, Dict
 from urllib.parse import urlencode
@@ -20,9 +19,14 @@ import boto3
 import requests
 from botocore.exceptions import ClientError
 
+from invocation_log import configure_logging
+
 # Configure logging
-LOGGER = logging.getLogger()
-LOGGER.setLevel(logging.INFO)
+LOGGER, INVOCATION_LOG = configure_logging(
+    "threads.callback",
+    os.environ.get("LOG_LEVEL", "INFO"),
+    float(os.environ.get("LOG_SAMPLE_RATE", "0.01")),
+)
 
 # AWS clients
 secrets_manager = boto3.client("secretsmanager")
@@ -101,17 +105,17 @@ def _load_app_credentials(credentials_secret_name: str) -> tuple[str, str]:
         return app_id, app_secret
 
     except secrets_manager.exceptions.ResourceNotFoundException:
-        LOGGER.error(f"Credentials secret not found: {credentials_secret_name}")
+        LOGGER.error("Credentials secret not found: %s", credentials_secret_name)
         raise SecretRetrievalError(f"Credentials secret not found: {credentials_secret_name}")
     except ClientError as e:
         error_code = e.response.get("Error", {}).get("Code", "Unknown")
-        LOGGER.error(f"Failed to retrieve credentials secret: {error_code}")
+        LOGGER.error("Failed to retrieve credentials secret: %s", error_code)
         raise SecretRetrievalError(f"Failed to retrieve credentials: {error_code}") from e
     except json.JSONDecodeError as e:
-        LOGGER.error(f"Failed to parse credentials secret: {e}")
+        LOGGER.error("Failed to parse credentials secret: %s", e)
         raise SecretRetrievalError("Invalid JSON in credentials secret") from e
     except KeyError as e:
-        LOGGER.error(f"Missing required field in credentials secret: {e}")
+        LOGGER.error("Missing required field in credentials secret: %s", e)
         raise SecretRetrievalError(f"Missing required field: {e}") from e
 
 
@@ -157,16 +161,16 @@ def _exchange_token(code: str, app_id: str, app_secret: str, redirect_uri: str,
 
     except requests.exceptions.HTTPError as e:
         error_body = e.response.text if e.response else "No error body"
-        LOGGER.error(f"HTTP error during token exchange: {e.response.status_code} - {error_body}")
+        LOGGER.error("HTTP error during token exchange: %s - %s", e.response.status_code, error_body)
         raise TokenExchangeError(f"Token exchange failed with HTTP {e.response.status_code}") from e
     except requests.exceptions.RequestException as e:
-        LOGGER.error(f"Request error during token exchange: {e}")
+        LOGGER.error("Request error during token exchange: %s", e)
         raise TokenExchangeError("Failed to reach token endpoint") from e
     except json.JSONDecodeError as e:
-        LOGGER.error(f"Failed to parse token response: {e}")
+        LOGGER.error("Failed to parse token response: %s", e)
         raise TokenExchangeError("Invalid JSON response from token endpoint") from e
     except ValueError as e:
-        LOGGER.error(f"Invalid app_id format: {e}")
+        LOGGER.error("Invalid app_id format: %s", e)
         raise TokenExchangeError("Invalid app_id format") from e
 
 
@@ -211,10 +215,10 @@ def _exchange_for_long_lived_token(access_token: str, app_secret: str) -> str:
         return long_lived_token
 
     except json.JSONDecodeError as e:
-        LOGGER.error(f"Failed to parse long-lived token response: {e}")
+        LOGGER.error("Failed to parse long-lived token response: %s", e)
         raise TokenExchangeError("Invalid JSON response from long-lived token endpoint") from e
     except Exception as e:
-        LOGGER.error(f"Error during long-lived token exchange: {e}")
+        LOGGER.error("Error during long-lived token exchange: %s", e)
         raise TokenExchangeError(f"Failed to exchange for long-lived token: {e}") from e
 
 
@@ -244,7 +248,7 @@ def _store_access_token(access_token: str, long_lived_token: str, user_id: str,
                 SecretId=secret_name,
                 SecretString=secret_value
             )
-            LOGGER.info(f"Updated existing secret: {secret_name}")
+            LOGGER.info("Updated existing secret: %s", secret_name)
         except secrets_manager.exceptions.ResourceNotFoundException:
             # Secret doesn't exist, create it
             secrets_manager.create_secret(
@@ -252,21 +256,20 @@ def _store_access_token(access_token: str, long_lived_token: str, user_id: str,
                 SecretString=secret_value,
                 Description=f"Threads access token for user {user_id}"
             )
-            LOGGER.info(f"Created new secret: {secret_name}")
+            LOGGER.info("Created new secret: %s", secret_name)
 
     except ClientError as e:
         error_code = e.response.get("Error", {}).get("Code", "Unknown")
-        LOGGER.error(f"Failed to store access token: {error_code}")
+        LOGGER.error("Failed to store access token: %s", error_code)
         raise SecretStorageError(f"Failed to store token: {error_code}") from e
 
 
-def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
+def _handle_callback_request(event: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Lambda handler for Threads OAuth callback.
+    Complete the OAuth flow, mapping errors to API Gateway responses.
 
     Args:
         event: API Gateway event
-        _context: Lambda context
 
     Returns:
         API Gateway response
@@ -284,6 +287,7 @@ def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
         user_id = "".join(c for c in user_id if c.isalnum() or c in ("-", "_"))
         if not user_id:
             user_id = "default"
+        INVOCATION_LOG.bind(user_id=user_id)
 
         # Get environment variables
         credentials_secret_name = os.environ.get("CREDENTIALS_SECRET_NAME", "threads_app_credentials")
@@ -313,7 +317,7 @@ def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
         }
 
     except MissingParameterError as e:
-        LOGGER.warning(f"Missing parameter: {e}")
+        LOGGER.warning("Missing parameter: %s", e)
         return {
             "statusCode": 400,
             "headers": {"Content-Type": "application/json"},
@@ -324,7 +328,7 @@ def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
         }
 
     except SecretRetrievalError as e:
-        LOGGER.error(f"Secret retrieval error: {e}")
+        LOGGER.error("Secret retrieval error: %s", e)
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
@@ -335,7 +339,7 @@ def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
         }
 
     except TokenExchangeError as e:
-        LOGGER.error(f"Token exchange error: {e}")
+        LOGGER.error("Token exchange error: %s", e)
         return {
             "statusCode": 502,
             "headers": {"Content-Type": "application/json"},
@@ -346,7 +350,7 @@ def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
         }
 
     except SecretStorageError as e:
-        LOGGER.error(f"Secret storage error: {e}")
+        LOGGER.error("Secret storage error: %s", e)
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
@@ -366,3 +370,23 @@ def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
                 "message": "An unexpected error occurred"
             }),
         }
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Lambda handler for Threads OAuth callback.
+
+    Args:
+        event: API Gateway event
+        context: Lambda context
+
+    Returns:
+        API Gateway response
+    """
+    INVOCATION_LOG.start(context, event)
+    response = None
+    try:
+        response = _handle_callback_request(event)
+        return response
+    finally:
+        INVOCATION_LOG.finish(response)
@@ -0,0 +1,169 @@
+"""
+Per-invocation structured logging shared by the Threads Lambda functions.
+
+Terraform copies this module into each Lambda deployment package next to
+main.py (see terraform/lambda.tf), so handlers import it as a top-level module.
+"""
+
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, TextIO
+
+
+class InvocationLogHandler(logging.Handler):
+    """
+    Buffer log records for one invocation and emit a single JSON summary.
+
+    Records are kept unformatted until the invocation finishes. Their text is
+    only rendered when the invocation failed (any WARNING or above, or a 5xx
+    response) or was picked by the sample rate; otherwise they are dropped and
+    only the summary line is written.
+
+    A Lambda killed by its timeout never reaches the summary, so a watcher
+    thread writes the buffer as a "partial" line FLUSH_MARGIN_MS before the
+    invocation deadline. The buffer is kept, so if the invocation still
+    finishes its summary carries the full detail.
+    """
+
+    MAX_RECORDS = 100
+    FLUSH_MARGIN_MS = 1000
+
+    def __init__(self, sample_rate: float, stream: Optional[TextIO] = None) -> None:
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.stream = stream
+        self.setFormatter(logging.Formatter("%(message)s"))
+        self._deadline: Optional[float] = None
+        self._deadline_changed = threading.Condition(self.lock)
+        self._watcher: Optional[threading.Thread] = None
+        self.start(None, {})
+
+    def start(self, context: Any, event: Dict[str, Any]) -> None:
+        """Reset the buffer and record request IDs for a new invocation."""
+        request_context = event.get("requestContext") or {}
+
+        get_remaining_time = getattr(context, "get_remaining_time_in_millis", None)
+
+        with self.lock:
+            self.records: List[logging.LogRecord] = []
+            self.dropped = 0
+            self.max_level = logging.NOTSET
+            self.fields: Dict[str, Any] = {
+                "request_id": getattr(context, "aws_request_id", None),
+                "api_request_id": request_context.get("requestId"),
+            }
+            self.sampled = random.random() < self.sample_rate
+            self.started = time.perf_counter()
+
+            self._deadline = None
+            if get_remaining_time is not None:
+                flush_in_ms = get_remaining_time() - self.FLUSH_MARGIN_MS
+                self._deadline = time.monotonic() + max(flush_in_ms, 0) / 1000
+                if self._watcher is None:
+                    self._watcher = threading.Thread(target=self._watch_deadline, daemon=True)
+                    self._watcher.start()
+                self._deadline_changed.notify()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.max_level = max(self.max_level, record.levelno)
+            if len(self.records) < self.MAX_RECORDS:
+                self.records.append(record)
+            else:
+                self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def bind(self, **fields: Any) -> None:
+        """Attach fields (for example user_id) to the invocation summary."""
+        with self.lock:
+            self.fields.update(fields)
+
+    def finish(self, response: Optional[Dict[str, Any]]) -> None:
+        """Write the invocation summary line to stdout (CloudWatch)."""
+        status_code = (response or {}).get("statusCode", 500)
+
+        with self.lock:
+            self._deadline = None
+            summary: Dict[str, Any] = {
+                **self.fields,
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            }
+
+            if self.sampled or self.max_level >= logging.WARNING or status_code >= 500:
+                summary["sampled"] = self.sampled
+                summary.update(self._detail())
+
+            self._write(summary)
+            self.records = []
+
+    def _detail(self) -> Dict[str, Any]:
+        """Render the buffered records."""
+        detail: Dict[str, Any] = {
+            "detail": [
+                {"level": record.levelname, "message": self._render(record)}
+                for record in self.records
+            ],
+        }
+        if self.dropped:
+            detail["detail_dropped"] = self.dropped
+        return detail
+
+    def _render(self, record: logging.LogRecord) -> str:
+        """Format a record, never raising for a malformed logging call."""
+        try:
+            return self.format(record)
+        except Exception:
+            self.handleError(record)
+            return f"<unformattable log record: {record.msg!r}>"
+
+    def _watch_deadline(self) -> None:
+        """Write the buffer once the current invocation's deadline passes."""
+        with self._deadline_changed:
+            while True:
+                if self._deadline is None:
+                    self._deadline_changed.wait()
+                    continue
+
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._deadline_changed.wait(remaining)
+                    continue
+
+                self._deadline = None
+                self._write({**self.fields, "status": None, "partial": True, "deadline_near": True, **self._detail()})
+
+    def _write(self, line: Dict[str, Any]) -> None:
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(line, default=str) + "\n")
+        stream.flush()
+
+
+def configure_logging(name: str, level: str, sample_rate: float) -> tuple[logging.Logger, InvocationLogHandler]:
+    """
+    Create a named, non-propagating logger that buffers into an InvocationLogHandler.
+
+    Args:
+        name: Logger name
+        level: Minimum level name (DEBUG, INFO, WARNING or ERROR)
+        sample_rate: Fraction of successful invocations logged with full detail
+
+    Returns:
+        Tuple of (logger, handler)
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+    for handler in list(logger.handlers):
+        if isinstance(handler, InvocationLogHandler):
+            logger.removeHandler(handler)
+
+    handler = InvocationLogHandler(sample_rate)
+    logger.addHandler(handler)
+    return logger, handler
@@ -0,0 +1,20 @@
+# In-flight request counters, per-request leases and upstream latency shared
+# by warm API Lambda containers for admission control
+resource "aws_dynamodb_table" "admission" {
+  name         = "${local.name_prefix}-admission"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "pk"
+  range_key    = "sk"
+
+  attribute {
+    name = "pk"
+    type = "S"
+  }
+
+  attribute {
+    name = "sk"
+    type = "S"
+  }
+
+  tags = local.tags
+}
@@ -2,16 +2,42 @@ data "aws_caller_identity" "current" {}
 
 data "aws_partition" "current" {}
 
+locals {
+  # Python modules packaged with each Lambda: its own directory plus source/shared
+  lambda_source_files = {
+    for name in ["callback", "api"] : name => merge(
+      { for f in fileset("${path.root}/../source/${name}", "*.py") : f => "${path.root}/../source/${name}/${f}" },
+      { for f in fileset("${path.root}/../source/shared", "*.py") : f => "${path.root}/../source/shared/${f}" }
+    )
+  }
+}
+
 data "archive_file" "callback" {
   type        = "zip"
-  source_dir  = "${path.root}/../source/callback"
   output_path = "${path.root}/callback.zip"
+
+  dynamic "source" {
+    for_each = local.lambda_source_files["callback"]
+
+    content {
+      filename = source.key
+      content  = file(source.value)
+    }
+  }
 }
 
 data "archive_file" "api" {
   type        = "zip"
-  source_dir  = "${path.root}/../source/api"
   output_path = "${path.root}/api.zip"
+
+  dynamic "source" {
+    for_each = local.lambda_source_files["api"]
+
+    content {
+      filename = source.key
+      content  = file(source.value)
+    }
+  }
 }
 
 locals {
@@ -43,6 +69,8 @@ module "callback_lambda" {
     REDIRECT_URI             = local.callback_redirect_uri
     CREDENTIALS_SECRET_NAME  = var.credentials_secret_name
     SECRET_NAME_PREFIX       = var.secret_name_prefix
+    LOG_LEVEL                = var.log_level
+    LOG_SAMPLE_RATE          = tostring(var.log_sample_rate)
   }
 
   tags = local.tags
@@ -59,14 +87,21 @@ module "api_lambda" {
   package_source_file = data.archive_file.api.output_path
   source_code_hash    = data.archive_file.api.output_base64sha256
 
-  timeout     = 30
+  timeout     = var.api_lambda_timeout
   memory_size = 256
 
   layers = ["arn:aws:lambda:us-east-1:601333025120:layer:requests-layer:1"]
 
   environment_variables = {
-    THREADS_API_URL    = var.threads_api_url
-    SECRET_NAME_PREFIX = var.secret_name_prefix
+    THREADS_API_URL               = var.threads_api_url
+    SECRET_NAME_PREFIX            = var.secret_name_prefix
+    LOG_LEVEL                     = var.log_level
+    LOG_SAMPLE_RATE               = tostring(var.log_sample_rate)
+    ADMISSION_TABLE_NAME          = aws_dynamodb_table.admission.name
+    ADMISSION_GLOBAL_LIMIT        = tostring(var.admission_global_limit)
+    ADMISSION_USER_LIMIT          = tostring(var.admission_user_limit)
+    ADMISSION_SLOW_UPSTREAM_MS    = tostring(var.admission_slow_upstream_ms)
+    ADMISSION_LEASE_SECONDS       = tostring(var.api_lambda_timeout + var.admission_lease_grace_seconds)
   }
 
   tags = local.tags
@@ -117,3 +152,23 @@ resource "aws_iam_role_policy" "api_secrets" {
   role   = module.api_lambda.role_name
   policy = data.aws_iam_policy_document.api_secrets.json
 }
+
+data "aws_iam_policy_document" "api_admission" {
+  statement {
+    sid = "AdmissionCountersAccess"
+    actions = [
+      "dynamodb:GetItem",
+      "dynamodb:PutItem",
+      "dynamodb:UpdateItem",
+      "dynamodb:DeleteItem",
+      "dynamodb:Query"
+    ]
+    resources = [aws_dynamodb_table.admission.arn]
+  }
+}
+
+resource "aws_iam_role_policy" "api_admission" {
+  name   = "${module.api_lambda.function_name}-admission-access"
+  role   = module.api_lambda.role_name
+  policy = data.aws_iam_policy_document.api_admission.json
+}
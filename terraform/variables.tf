@@ -46,6 +46,63 @@ variable "secret_name_prefix" {
   default     = "threads/tokens"
 }
 
+variable "log_level" {
+  description = "Minimum log level buffered by the Lambda functions (DEBUG, INFO, WARNING, ERROR)"
+  type        = string
+  default     = "INFO"
+
+  validation {
+    condition     = contains(["DEBUG", "INFO", "WARNING", "ERROR"], var.log_level)
+    error_message = "log_level must be one of DEBUG, INFO, WARNING or ERROR."
+  }
+}
+
+variable "log_sample_rate" {
+  description = "Fraction of successful invocations (0-1) whose step-by-step log detail is written alongside the summary line"
+  type        = number
+  default     = 0.01
+
+  validation {
+    condition     = var.log_sample_rate >= 0 && var.log_sample_rate <= 1
+    error_message = "log_sample_rate must be between 0 and 1."
+  }
+}
+
+variable "api_lambda_timeout" {
+  description = "Timeout in seconds for the posting Lambda function"
+  type        = number
+  default     = 30
+}
+
+variable "admission_global_limit" {
+  description = "Maximum in-flight post requests across all API Lambda containers; normal and low priority requests may use 80% and 50% of it"
+  type        = number
+  default     = 50
+}
+
+variable "admission_user_limit" {
+  description = "Maximum in-flight post requests per user"
+  type        = number
+  default     = 5
+}
+
+variable "admission_slow_upstream_ms" {
+  description = "Average Threads API latency in milliseconds above which low priority posts are rejected and normal priority posts are limited to the low priority share"
+  type        = number
+  default     = 5000
+}
+
+variable "admission_lease_grace_seconds" {
+  description = "Seconds after the posting Lambda timeout before an unreleased in-flight slot (from a killed invocation) is reclaimed"
+  type        = number
+  default     = 30
+
+  validation {
+    condition     = var.admission_lease_grace_seconds > 0
+    error_message = "admission_lease_grace_seconds must be greater than 0."
+  }
+}
+
 variable "tags" {
   description = "Additional tags to apply to resources"
   type        = map(string)
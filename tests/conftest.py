@@ -0,0 +1,10 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Lambda packages are flat: main.py and the shared modules sit side by side
+sys.path.insert(0, os.path.join(ROOT, "source", "shared"))
+sys.path.insert(0, os.path.join(ROOT, "source", "api"))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
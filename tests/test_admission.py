@@ -0,0 +1,234 @@
+import contextlib
+import time
+from unittest import mock
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+from botocore.stub import ANY, Stubber
+
+from admission import (
+    AdmissionController,
+    DynamoDBCounterStore,
+    InMemoryCounterStore,
+    OverloadedError,
+)
+
+
+@pytest.fixture
+def controller():
+    return AdmissionController(
+        InMemoryCounterStore(),
+        global_limit=10,
+        user_limit=2,
+        slow_upstream_ms=1000,
+        lease_seconds=60,
+    )
+
+
+def _admitted(controller, requests):
+    """Enter admit() for each (user_id, priority); return how many were admitted."""
+    admitted = 0
+    with contextlib.ExitStack() as stack:
+        for index, (user_id, priority) in enumerate(requests):
+            try:
+                stack.enter_context(controller.admit(user_id, priority, f"lease-{index}"))
+                admitted += 1
+            except OverloadedError:
+                pass
+    return admitted
+
+
+class UnavailableStore(InMemoryCounterStore):
+    def try_acquire(self, *args):
+        raise EndpointConnectionError(endpoint_url="https://dynamodb")
+
+    def release(self, *args):
+        raise EndpointConnectionError(endpoint_url="https://dynamodb")
+
+    def set_upstream_latency_ms(self, latency_ms):
+        raise EndpointConnectionError(endpoint_url="https://dynamodb")
+
+
+def test_per_user_cap(controller):
+    assert _admitted(controller, [("a", "normal")] * 3) == 2
+    assert _admitted(controller, [("a", "normal"), ("a", "normal"), ("b", "normal")]) == 3
+
+
+@pytest.mark.parametrize("priority, expected", [("high", 10), ("normal", 8), ("low", 5)])
+def test_global_cap_per_priority(controller, priority, expected):
+    requests = [(f"user-{i}", priority) for i in range(12)]
+    assert _admitted(controller, requests) == expected
+
+
+def test_slow_upstream_sheds_low_and_limits_normal(controller):
+    controller.record_upstream_latency(2500)
+
+    with pytest.raises(OverloadedError) as excinfo:
+        with controller.admit("a", "low", "lease-1"):
+            pass
+    assert excinfo.value.retry_after == 3
+
+    assert controller.global_limit_for("normal") == 5
+    assert controller.global_limit_for("high") == 10
+
+
+def test_stale_upstream_latency_is_ignored(controller):
+    controller.latency_window_seconds = 0.1
+    controller.record_upstream_latency(2500)
+    assert controller.upstream_latency_ms() == 2500
+
+    time.sleep(0.2)
+    assert controller.upstream_latency_ms() == 0
+    assert _admitted(controller, [("a", "low")]) == 1
+
+
+def test_slots_released_on_exception(controller):
+    with pytest.raises(RuntimeError):
+        with controller.admit("a", "normal", "lease-1"):
+            raise RuntimeError("upstream failed")
+
+    assert controller.store.in_flight("global") == 0
+    assert controller.store.in_flight("user#a") == 0
+
+
+def test_global_slot_released_when_user_cap_rejects(controller):
+    with controller.admit("a", "normal", "lease-1"), controller.admit("a", "normal", "lease-2"):
+        with pytest.raises(OverloadedError):
+            with controller.admit("a", "normal", "lease-3"):
+                pass
+        assert controller.store.in_flight("global") == 2
+
+
+def test_expired_lease_frees_slot():
+    store = InMemoryCounterStore()
+    assert store.try_acquire("global", "killed", 1, expires_at=time.time() - 1)
+    assert store.in_flight("global") == 0
+    assert store.try_acquire("global", "next", 1, expires_at=time.time() + 60)
+    assert not store.try_acquire("global", "third", 1, expires_at=time.time() + 60)
+
+
+def test_store_errors_fail_open(controller):
+    controller.store = UnavailableStore()
+
+    with controller.admit("a", "low", "lease-1"):
+        controller.record_upstream_latency(100)
+
+
+def test_store_skipped_after_error(controller):
+    controller.store_retry_seconds = 0.1
+    controller.store = UnavailableStore()
+    with controller.admit("a", "low", "lease-1"):
+        pass
+
+    controller.store = mock.Mock(wraps=InMemoryCounterStore())
+    with controller.admit("a", "low", "lease-2"):
+        controller.record_upstream_latency(100)
+    controller.store.try_acquire.assert_not_called()
+    controller.store.set_upstream_latency_ms.assert_not_called()
+
+    time.sleep(0.1)
+    with controller.admit("a", "low", "lease-3"):
+        pass
+    assert controller.store.try_acquire.call_count == 2
+
+
+@pytest.fixture
+def dynamodb_store():
+    client = boto3.client("dynamodb", region_name="us-east-1")
+    with Stubber(client) as stubber:
+        yield DynamoDBCounterStore(client, "admission"), stubber
+        stubber.assert_no_pending_responses()
+
+
+def _cancelled(stubber, *codes):
+    stubber.add_client_error(
+        "transact_write_items",
+        "TransactionCanceledException",
+        modeled_fields={"CancellationReasons": [{"Code": code} for code in codes]},
+    )
+
+
+def test_dynamodb_acquire_creates_lease_with_counter(dynamodb_store):
+    store, stubber = dynamodb_store
+    stubber.add_response("transact_write_items", {})
+
+    assert store.try_acquire("global", "lease-1", 1, time.time() + 60)
+
+
+def test_dynamodb_acquire_at_cap_without_expired_leases_rejects(dynamodb_store):
+    store, stubber = dynamodb_store
+    _cancelled(stubber, "ConditionalCheckFailed", "None")
+    stubber.add_response("query", {"Items": []})
+
+    assert not store.try_acquire("global", "lease-1", 1, time.time() + 60)
+
+
+def test_dynamodb_acquire_at_cap_reclaims_expired_lease(dynamodb_store):
+    store, stubber = dynamodb_store
+    _cancelled(stubber, "ConditionalCheckFailed", "None")
+    stubber.add_response("query", {"Items": [{"sk": {"S": "lease#killed"}}]})
+    stubber.add_response("transact_write_items", {})
+    stubber.add_response("transact_write_items", {})
+
+    assert store.try_acquire("global", "lease-1", 1, time.time() + 60)
+
+
+def test_dynamodb_acquire_retried_after_commit_keeps_lease(dynamodb_store):
+    store, stubber = dynamodb_store
+    _cancelled(stubber, "None", "ConditionalCheckFailed")
+
+    assert store.try_acquire("global", "lease-1", 1, time.time() + 60)
+
+
+def test_dynamodb_release_deletes_lease_with_counter(dynamodb_store):
+    store, stubber = dynamodb_store
+    stubber.add_response(
+        "transact_write_items",
+        {},
+        {
+            "TransactItems": [
+                {
+                    "Delete": {
+                        "TableName": "admission",
+                        "Key": {"pk": {"S": "global"}, "sk": {"S": "lease#lease-1"}},
+                        "ConditionExpression": "attribute_exists(sk)",
+                    },
+                },
+                {
+                    "Update": {
+                        "TableName": "admission",
+                        "Key": {"pk": {"S": "global"}, "sk": {"S": "counter"}},
+                        "UpdateExpression": "ADD in_flight :delta",
+                        "ExpressionAttributeValues": {":delta": {"N": "-1"}},
+                    },
+                },
+            ],
+            "ClientRequestToken": ANY,
+        },
+    )
+
+    store.release("global", "lease-1")
+
+
+def test_dynamodb_release_of_reclaimed_lease_leaves_counter(dynamodb_store):
+    store, stubber = dynamodb_store
+    _cancelled(stubber, "ConditionalCheckFailed", "None")
+
+    store.release("global", "lease-1")
+
+
+def test_dynamodb_release_failure_is_raised_without_partial_write(dynamodb_store):
+    store, stubber = dynamodb_store
+    stubber.add_client_error("transact_write_items", "ProvisionedThroughputExceededException")
+
+    with pytest.raises(ClientError):
+        store.release("global", "lease-1")
+
+
+def test_dynamodb_acquire_retries_transaction_conflict(dynamodb_store):
+    store, stubber = dynamodb_store
+    _cancelled(stubber, "TransactionConflict", "None")
+    stubber.add_response("transact_write_items", {})
+
+    assert store.try_acquire("global", "lease-1", 1, time.time() + 60)
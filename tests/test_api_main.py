@@ -0,0 +1,93 @@
+import json
+from unittest import mock
+
+import pytest
+
+import main
+from admission import AdmissionController, InMemoryCounterStore
+
+
+class FakeContext:
+    aws_request_id = "req-1"
+
+    def __init__(self, remaining_ms=30000):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def read(self):
+        return self.body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+@pytest.fixture(autouse=True)
+def api(monkeypatch):
+    monkeypatch.setenv("SECRET_NAME_PREFIX", "threads/tokens")
+    monkeypatch.setattr(
+        main,
+        "ADMISSION",
+        AdmissionController(
+            InMemoryCounterStore(), global_limit=2, user_limit=1, slow_upstream_ms=1000, lease_seconds=60
+        ),
+    )
+    secret = {"SecretString": json.dumps({"long_lived_token": "token"})}
+    monkeypatch.setattr(main.secrets_manager, "get_secret_value", mock.Mock(return_value=secret))
+    urlopen = mock.Mock(return_value=FakeResponse(b'{"id": "123"}'))
+    monkeypatch.setattr(main.urllib.request, "urlopen", urlopen)
+    return urlopen
+
+
+def _event(**body):
+    return {"body": json.dumps({"user_id": "u1", "post_text": "hello", **body})}
+
+
+def test_post_succeeds_and_releases_slots(api):
+    response = main.lambda_handler(_event(), FakeContext())
+
+    assert response["statusCode"] == 200
+    assert main.ADMISSION.store.in_flight("global") == 0
+    assert main.ADMISSION.store.in_flight("user#u1") == 0
+
+
+def test_rejected_request_gets_429_with_retry_after():
+    main.ADMISSION.record_upstream_latency(4200)
+
+    response = main.lambda_handler(_event(priority="low"), FakeContext())
+
+    assert response["statusCode"] == 429
+    assert response["headers"]["Retry-After"] == "5"
+    assert json.loads(response["body"])["error"] == "Too Many Requests"
+
+
+def test_invalid_priority_is_rejected():
+    response = main.lambda_handler(_event(priority="urgent"), FakeContext())
+
+    assert response["statusCode"] == 400
+
+
+def test_upstream_timeout_leaves_margin_before_deadline(api):
+    main.lambda_handler(_event(), FakeContext(remaining_ms=10000))
+
+    timeouts = [call.kwargs["timeout"] for call in api.call_args_list]
+    assert timeouts == [7.0, 7.0]
+
+
+def test_no_time_left_releases_slots_and_returns_503(api):
+    response = main.lambda_handler(_event(), FakeContext(remaining_ms=3500))
+
+    assert response["statusCode"] == 503
+    assert response["headers"]["Retry-After"] == "1"
+    api.assert_not_called()
+    assert main.ADMISSION.store.in_flight("global") == 0
+    assert main.ADMISSION.store.in_flight("user#u1") == 0
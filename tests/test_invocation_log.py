@@ -0,0 +1,119 @@
+import io
+import json
+import logging
+import time
+from unittest import mock
+
+import pytest
+
+from invocation_log import InvocationLogHandler
+
+
+class FakeContext:
+    aws_request_id = "req-1"
+
+    def __init__(self, remaining_ms=30000):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+@pytest.fixture
+def log():
+    stream = io.StringIO()
+    handler = InvocationLogHandler(sample_rate=0.0, stream=stream)
+    logger = logging.getLogger("tests.invocation_log")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(handler)
+    yield logger, handler, stream
+    logger.removeHandler(handler)
+
+
+def _lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_success_writes_single_summary_without_detail(log):
+    logger, handler, stream = log
+    handler.start(FakeContext(), {"requestContext": {"requestId": "api-1"}})
+    handler.bind(user_id="u1")
+    logger.info("step %s", 1)
+    handler.finish({"statusCode": 200})
+
+    (summary,) = _lines(stream)
+    assert summary["request_id"] == "req-1"
+    assert summary["api_request_id"] == "api-1"
+    assert summary["user_id"] == "u1"
+    assert summary["status"] == 200
+    assert "detail" not in summary
+
+
+def test_sampled_success_includes_detail(log):
+    logger, handler, stream = log
+    handler.sample_rate = 1.0
+    handler.start(FakeContext(), {})
+    logger.info("step %s", 1)
+    handler.finish({"statusCode": 200})
+
+    (summary,) = _lines(stream)
+    assert summary["sampled"] is True
+    assert summary["detail"] == [{"level": "INFO", "message": "step 1"}]
+
+
+def test_error_summary_carries_full_detail(log):
+    logger, handler, stream = log
+    handler.start(FakeContext(), {})
+    logger.info("before")
+    logger.warning("went wrong: %s", "boom")
+    handler.bind(user_id="u1")
+    handler.finish({"statusCode": 404})
+
+    (summary,) = _lines(stream)
+    assert summary["status"] == 404
+    assert summary["user_id"] == "u1"
+    assert [d["message"] for d in summary["detail"]] == ["before", "went wrong: boom"]
+
+
+def test_buffer_is_flushed_before_deadline(log):
+    logger, handler, stream = log
+    handler.start(FakeContext(remaining_ms=InvocationLogHandler.FLUSH_MARGIN_MS + 20), {})
+    logger.info("waiting on upstream")
+    time.sleep(0.2)
+
+    (partial,) = _lines(stream)
+    assert partial["deadline_near"] is True
+    assert partial["status"] is None
+    assert partial["detail"] == [{"level": "INFO", "message": "waiting on upstream"}]
+
+    logger.error("upstream timed out")
+    handler.finish({"statusCode": 502})
+    summary = _lines(stream)[-1]
+    assert [d["message"] for d in summary["detail"]] == ["waiting on upstream", "upstream timed out"]
+
+
+def test_finish_cancels_deadline_flush(log):
+    logger, handler, stream = log
+    handler.start(FakeContext(remaining_ms=InvocationLogHandler.FLUSH_MARGIN_MS + 50), {})
+    handler.finish({"statusCode": 200})
+    time.sleep(0.2)
+
+    assert len(_lines(stream)) == 1
+
+
+def test_malformed_log_calls_never_raise(log):
+    logger, handler, stream = log
+    handler.sample_rate = 1.0
+    handler.start(FakeContext(), {})
+    with mock.patch.object(logging, "raiseExceptions", False):
+        logger.info("bad %s %s", 1)
+        logger.warning("bad %d", "x")
+        handler.finish({"statusCode": 200})
+
+    (summary,) = _lines(stream)
+    assert summary["status"] == 200
+    assert [d["message"] for d in summary["detail"]] == [
+        "<unformattable log record: 'bad %s %s'>",
+        "<unformattable log record: 'bad %d'>",
+    ]